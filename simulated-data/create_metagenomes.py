@@ -4,26 +4,79 @@ Script to create metagenomes by combining reads from individual genomes
 with different abundance ratios and replicates.
 """
 
+import array
+import contextlib
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import mmap
+import multiprocessing
 import os
 import random
 import shutil
+import struct
+import sys
+import zlib
 from pathlib import Path
 import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def get_read_files(organism_dirs):
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Suffix of the sidecar file holding a FASTQ file's record offsets
+INDEX_SUFFIX = '.idx'
+
+# Marks the start of a sidecar index, ahead of the indexed file's size and mtime
+INDEX_MAGIC = b'FQIDX\x00\x00\x02'
+
+# Marks the start of a gzipped FASTQ file's sidecar, which holds its read counts instead of offsets
+GZIP_INDEX_MAGIC = b'GZIDX\x00\x00\x01'
+
+# Bytes of a FASTQ file scanned at a time while building its record index
+INDEX_CHUNK_SIZE = 64 << 20
+
+# Samples larger than this fraction of a file are read sequentially instead of by seeking
+SPARSE_SAMPLE_FRACTION = 0.25
+
+# Uncompressed bytes per BGZF block (the same limit bgzip uses)
+BGZF_BLOCK_SIZE = 0xff00
+
+# Empty BGZF block that marks the end of a BGZF file
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# Bytes of sampled records gathered before each write to the output
+WRITE_BATCH_SIZE = 1 << 20
+
+# Directory (under the output directory) holding sampled reads reused across runs
+SAMPLE_CACHE_DIR = '.sample_cache'
+
+# Bump whenever the sampling algorithm changes, so stale cached samples are not reused
+SAMPLE_CACHE_VERSION = 2
+
+def get_read_files(organism_dirs, verbose=False):
     """Get all read files from organism directories"""
     read_files = {}
     
     for org_dir in organism_dirs:
         org_path = Path(org_dir)
         if org_path.exists():
-            # Find the read file (non-FastQC files)
-            read_files_found = [f for f in org_path.iterdir() 
-                              if f.is_file() and not f.name.endswith(('_fastqc.html', '_fastqc.zip'))]
+            # Find the first (and likely only) read file, skipping FastQC reports,
+            # index sidecars and temporary files left by interrupted runs; scandir
+            # entries carry their file type, so only symlinks need an extra stat
+            with os.scandir(org_path) as entries:
+                skipped = ('_fastqc.html', '_fastqc.zip', INDEX_SUFFIX, '.tmp')
+                read_file = next((Path(e.path) for e in entries
+                                  if e.is_file() and not e.name.endswith(skipped)), None)
             
-            if read_files_found:
-                read_files[org_dir] = read_files_found[0]  # Take the first (and likely only) read file
-                print(f"Found reads for {org_dir}: {read_files_found[0].name}")
+            if read_file is not None:
+                read_files[org_dir] = read_file
+                if verbose:
+                    print(f"Found reads for {org_dir}: {read_file.name}")
             else:
                 print(f"No read files found in {org_dir}")
         else:
@@ -31,39 +84,406 @@ def get_read_files(organism_dirs):
     
     return read_files
 
-def count_reads_in_file(file_path):
+def count_reads_in_file(file_path, bufsize=4 << 20):
     """Count number of reads in a FASTQ file"""
-    with open(file_path, 'r') as f:
-        return sum(1 for line in f) // 4
+    # Key the cache on mtime and size as well, so a rewritten file is recounted
+    file_path = Path(file_path).resolve()
+    file_stat = file_path.stat()
+    return _count_reads_cached(str(file_path), file_stat.st_mtime_ns, file_stat.st_size, bufsize)
+
+@functools.lru_cache(maxsize=None)
+def _count_reads_cached(path_str, mtime_ns, size, bufsize):
+    """Count reads in a FASTQ file, memoized per (path, mtime, size)"""
+    # Count newlines over raw binary chunks rather than decoding every line
+    num_lines = 0
+    if is_gzipped(path_str):
+        f = gzip.open(path_str, 'rb')
+    else:
+        f = open(path_str, 'rb', buffering=0)
+    with f:
+        while chunk := f.read(bufsize):
+            num_lines += chunk.count(b'\n')
+    return num_lines // 4
+
+def is_gzipped(file_path):
+    """Check whether a reads file is gzip-compressed, going by its suffix"""
+    return str(file_path).endswith('.gz')
+
+def is_bgzf(file_path):
+    """Check whether a gzip file is BGZF, i.e. its first member carries the BC extra subfield"""
+    with open(file_path, 'rb') as f:
+        header = f.read(18)
+    return len(header) == 18 and header[:4] == b'\x1f\x8b\x08\x04' and header[10:14] == b'\x06\x00BC'
+
+def open_reads(file_path):
+    """Open a plain or gzipped FASTQ file for binary reading"""
+    return gzip.open(file_path, 'rb') if is_gzipped(file_path) else open(file_path, 'rb')
+
+def advise_sequential(handle):
+    """Hint the page cache that a file will be accessed sequentially (Linux only)"""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+def copy_file_into(input_file, out_handle, size=None):
+    """Append a whole file (or its first size bytes) to an open binary handle, zero-copy where the OS supports it"""
+    try:
+        out_fd = out_handle.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        # In-memory handle such as io.BytesIO
+        out_fd = None
+    
+    with open(input_file, 'rb') as infile:
+        if hasattr(os, 'sendfile') and out_fd is not None:
+            # Flush buffered output first, since sendfile writes at the fd level
+            out_handle.flush()
+            in_fd = infile.fileno()
+            if size is None:
+                size = os.fstat(in_fd).st_size
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                # Not supported for this pair of files; fall back if nothing was sent yet
+                if offset:
+                    raise
+        
+        advise_sequential(infile)
+        copy_stream_into(infile, out_handle, size)
+
+def copy_stream_into(infile, out_handle, size=None):
+    """Copy an open binary stream (or its first size bytes) to an open binary handle in 1 MiB chunks"""
+    if size is None:
+        shutil.copyfileobj(infile, out_handle, length=1 << 20)
+        return
+    remaining = size
+    while remaining and (chunk := infile.read(min(remaining, 1 << 20))):
+        out_handle.write(chunk)
+        remaining -= len(chunk)
+
+def copy_reads_into(input_file, out_handle):
+    """Append every complete read in a plain or gzipped FASTQ file to an open binary handle"""
+    # Anything after the last complete record (a trailing blank line, or a last
+    # record with no final newline) is left out, so it can't run into the next read
+    if not is_gzipped(input_file):
+        copy_file_into(input_file, out_handle, record_offsets(input_file)[-1])
+        return
+    
+    _, records_end, stream_size = gzip_read_stats(input_file)
+    if isinstance(out_handle, BgzfWriter) and is_bgzf(input_file) and records_end == stream_size:
+        # BGZF blocks are self-contained gzip members, so splice them in without
+        # decompressing; drop the input's EOF block, which readers would stop at
+        size = Path(input_file).stat().st_size
+        with open(input_file, 'rb') as infile:
+            infile.seek(max(size - len(BGZF_EOF), 0))
+            if infile.read() == BGZF_EOF:
+                size -= len(BGZF_EOF)
+        out_handle.flush()
+        copy_file_into(input_file, out_handle.raw, size)
+    else:
+        # Decompress; plain gzip members would also break a BGZF output's block structure
+        with gzip.open(input_file, 'rb') as infile:
+            copy_stream_into(infile, out_handle, records_end)
+
+class BgzfWriter:
+    """Minimal writer for BGZF, the blocked gzip format produced by bgzip
+    
+    Output is an ordinary multi-member gzip stream, so any gzip reader can
+    decompress it, while tools such as samtools and htslib can also use it
+    for random access and parallel decompression.
+    """
+    
+    def __init__(self, raw, level=6):
+        self.raw = raw
+        self.level = level
+        self.buffer = bytearray()
+    
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= BGZF_BLOCK_SIZE:
+            view = memoryview(self.buffer)
+            pos = 0
+            while len(self.buffer) - pos >= BGZF_BLOCK_SIZE:
+                self._write_block(view[pos:pos + BGZF_BLOCK_SIZE])
+                pos += BGZF_BLOCK_SIZE
+            view.release()
+            del self.buffer[:pos]
+        return len(data)
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        # Close off the pending block so everything written so far reaches raw
+        if self.buffer:
+            self._write_block(self.buffer)
+            self.buffer.clear()
+        self.raw.flush()
+    
+    def close(self):
+        self.flush()
+        self.raw.write(BGZF_EOF)
+        self.raw.flush()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        # gzip member header with the BC extra subfield holding the block size minus one
+        self.raw.write(struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25))
+        self.raw.write(compressed)
+        self.raw.write(struct.pack('<2I', zlib.crc32(data), len(data)))
+
+def iter_records(handle):
+    """Yield complete FASTQ records (4 newline-terminated lines each) from an open binary file handle"""
+    while True:
+        lines = list(itertools.islice(handle, 4))
+        # Stop at anything after the last complete record, such as a trailing blank line
+        if len(lines) < 4 or not lines[-1].endswith(b'\n'):
+            return
+        yield b''.join(lines)
+
+def _scan_offsets_numpy(file_path, size, offsets):
+    """Append the end offset of every complete FASTQ record to offsets, using vectorized newline search"""
+    if not size:
+        return
+    buf = np.memmap(file_path, dtype=np.uint8, mode='r')
+    line_count = 0
+    # Bound the temporary comparison arrays by scanning the map in slices
+    for start in range(0, size, INDEX_CHUNK_SIZE):
+        newlines = np.flatnonzero(buf[start:start + INDEX_CHUNK_SIZE] == 0x0A)
+        # Every 4th newline across the whole file ends a record
+        first = (3 - line_count) % 4
+        offsets.frombytes((newlines[first::4] + (start + 1)).astype(np.uint64).tobytes())
+        line_count += len(newlines)
+
+def _scan_offsets(file_path, offsets):
+    """Append the end offset of every complete FASTQ record to offsets, without NumPy"""
+    offset = 0
+    line_count = 0
+    with open(file_path, 'rb') as f:
+        # Line lengths are accumulated in C a chunk of whole lines at a time
+        while lines := f.readlines(INDEX_CHUNK_SIZE):
+            line_ends = list(itertools.accumulate(map(len, lines), initial=offset))
+            # Only newline-terminated lines count, so an unterminated last record
+            # is dropped exactly as in _scan_offsets_numpy
+            terminated = len(lines) if lines[-1].endswith(b'\n') else len(lines) - 1
+            first = (3 - line_count) % 4
+            offsets.extend(line_ends[first + 1:terminated + 1:4])
+            offset = line_ends[-1]
+            line_count += len(lines)
 
-def sample_reads(input_file, output_file, num_reads, seed=None):
-    """Sample a specific number of reads from a FASTQ file"""
-    if seed is not None:
-        random.seed(seed)
+def _write_sidecar(idx_path, header, write_payload):
+    """Write a sidecar index next to a reads file, if its directory is writable"""
+    # Write atomically, since several workers may index the same file; keep the
+    # index suffix on the temporary name so get_read_files never mistakes it for reads
+    tmp_path = idx_path.with_name(f"{idx_path.name[:-len(INDEX_SUFFIX)]}.{os.getpid()}.tmp{INDEX_SUFFIX}")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            write_payload(f)
+        os.replace(tmp_path, idx_path)
+    except OSError:
+        # Read-only input directory; keep the in-memory index only
+        tmp_path.unlink(missing_ok=True)
+
+@functools.lru_cache(maxsize=None)
+def record_offsets(file_path):
+    """Get the byte offset of every record in a FASTQ file, followed by the end offset of the last complete record"""
+    file_path = Path(file_path)
+    idx_path = file_path.with_name(file_path.name + INDEX_SUFFIX)
+    offsets = array.array('Q')
+    
+    # Reuse the sidecar index from an earlier run only if its header records
+    # exactly this file's size and mtime; a stale index would seek into the
+    # middle of records and emit garbage
+    file_stat = file_path.stat()
+    header = INDEX_MAGIC + struct.pack('<QQ', file_stat.st_size, file_stat.st_mtime_ns)
+    if idx_path.exists():
+        with open(idx_path, 'rb') as f:
+            if f.read(len(header)) == header:
+                offsets.fromfile(f, (idx_path.stat().st_size - len(header)) // offsets.itemsize)
+        if offsets:
+            return offsets
+    
+    offsets.append(0)
+    if np is not None:
+        _scan_offsets_numpy(file_path, file_stat.st_size, offsets)
+    else:
+        _scan_offsets(file_path, offsets)
+    
+    _write_sidecar(idx_path, header, offsets.tofile)
+    return offsets
+
+@functools.lru_cache(maxsize=None)
+def gzip_read_stats(file_path):
+    """Scan a gzipped FASTQ file for its complete reads
     
-    total_reads = count_reads_in_file(input_file)
+    Returns the number of complete reads, the decompressed offset just past
+    the last of them, and the total decompressed size. Results are kept in a
+    sidecar next to the file, so later runs don't decompress it again.
+    """
+    file_path = Path(file_path)
+    idx_path = file_path.with_name(file_path.name + INDEX_SUFFIX)
+    file_stat = file_path.stat()
+    header = GZIP_INDEX_MAGIC + struct.pack('<QQ', file_stat.st_size, file_stat.st_mtime_ns)
+    stats_format = struct.Struct('<3Q')
+    if idx_path.exists():
+        with open(idx_path, 'rb') as f:
+            if f.read(len(header)) == header and len(payload := f.read()) == stats_format.size:
+                return stats_format.unpack(payload)
+    
+    num_lines = 0
+    records_end = 0
+    stream_size = 0
+    with gzip.open(file_path, 'rb') as f:
+        while chunk := f.read(4 << 20):
+            count = chunk.count(b'\n')
+            # If a record-ending (every 4th) newline falls in this chunk, the last
+            # one is the (surplus + 1)-th newline counting back from the end
+            surplus = (num_lines + count) % 4
+            if count > surplus:
+                pos = len(chunk)
+                for _ in range(surplus + 1):
+                    pos = chunk.rfind(b'\n', 0, pos)
+                records_end = stream_size + pos + 1
+            num_lines += count
+            stream_size += len(chunk)
+    
+    stats = (num_lines // 4, records_end, stream_size)
+    _write_sidecar(idx_path, header, lambda f: f.write(stats_format.pack(*stats)))
+    return stats
+
+def read_count(file_path):
+    """Get the number of complete reads in an organism's FASTQ file, from its record index where possible"""
+    if is_gzipped(file_path):
+        return gzip_read_stats(file_path)[0]
+    return len(record_offsets(file_path)) - 1
+
+def sample_reads_into(input_file, out_handle, num_reads, seed=None):
+    """Sample a specific number of reads from a FASTQ file and append them to an open binary handle"""
+    total_reads = read_count(input_file)
     
     if num_reads >= total_reads:
-        # If we want all reads, just copy the file
-        shutil.copy2(input_file, output_file)
+        # If we want all reads, just copy the whole file across
+        copy_reads_into(input_file, out_handle)
         return total_reads
     
-    # Sample random line numbers (every 4th line starting from 0, 1, 2, 3)
-    selected_lines = set()
-    while len(selected_lines) < num_reads:
-        read_start = random.randint(0, total_reads - 1) * 4
-        for i in range(4):  # Each read is 4 lines
-            selected_lines.add(read_start + i)
+    # Gzipped reads can't be seeked into, so they are always read sequentially
+    if is_gzipped(input_file) or num_reads > total_reads * SPARSE_SAMPLE_FRACTION:
+        # Dense sample: seeking would touch most of the file anyway, so use
+        # reservoir sampling (Algorithm R) over a sequential read
+        rng = random.Random(seed)
+        reservoir = []
+        with open_reads(input_file) as infile:
+            advise_sequential(infile)
+            for i, record in enumerate(iter_records(infile)):
+                if i < num_reads:
+                    reservoir.append(record)
+                else:
+                    j = rng.randint(0, i)
+                    if j < num_reads:
+                        reservoir[j] = record
+        
+        out_handle.write(b''.join(reservoir))
+        return len(reservoir)
+    
+    # Sparse sample: slice each chosen record straight out of a memory map of
+    # the file, in file order, batching records so the output sees one write per MiB
+    offsets = record_offsets(input_file)
+    if np is not None:
+        # Vectorized selection without replacement, much faster for large samples
+        rng = np.random.default_rng(seed)
+        chosen = np.sort(rng.choice(total_reads, size=num_reads, replace=False, shuffle=False)).tolist()
+    else:
+        chosen = sorted(random.Random(seed).sample(range(total_reads), num_reads))
     
-    # Write selected reads to output file
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for line_num, line in enumerate(infile):
-            if line_num in selected_lines:
-                outfile.write(line)
+    buffer = bytearray()
+    with open(input_file, 'rb') as infile, \
+            mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, 'madvise'):
+            # Records are visited front to back; only skip readahead when most
+            # pages hold no chosen record at all
+            sparse = num_reads < len(mm) // mmap.PAGESIZE
+            mm.madvise(mmap.MADV_RANDOM if sparse else mmap.MADV_SEQUENTIAL)
+        with memoryview(mm) as view:
+            for idx in chosen:
+                buffer += view[offsets[idx]:offsets[idx + 1]]
+                if len(buffer) >= WRITE_BATCH_SIZE:
+                    out_handle.write(buffer)
+                    buffer.clear()
+    if buffer:
+        out_handle.write(buffer)
     
-    return len(selected_lines) // 4
+    return num_reads
+
+def organism_seed(org_name, replicate_num, num_reads):
+    """Derive a reproducible sampling seed for one organism's share of a replicate"""
+    # hash() is salted per process, so derive the seed from a stable digest instead
+    key = f"{Path(org_name).name}:{replicate_num}:{num_reads}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=4).digest(), 'big')
 
-def create_metagenome(euk_files, phage_files, euk_ratio, phage_ratio, output_dir, replicate_num, total_reads=100000):
+def sample_cache_path(cache_dir, input_file, num_reads, seed):
+    """Get the cache file for a sample of reads, keyed on the input's identity and the request"""
+    input_file = Path(input_file).resolve()
+    file_stat = input_file.stat()
+    # NumPy and the random module pick different reads for the same seed
+    sampler = 'numpy' if np is not None else 'random'
+    key = (f"{SAMPLE_CACHE_VERSION}:{sampler}:{input_file}:{file_stat.st_size}:{file_stat.st_mtime_ns}"
+           f":{num_reads}:{seed}")
+    return Path(cache_dir) / f"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.fastq"
+
+def _sample_worker(args):
+    """Sample reads from one organism file (runs in a worker process)
+    
+    Returns the number of reads sampled and either the sampled bytes or the
+    path of a cache file holding them, which the caller copies into the
+    metagenome; None means the whole input file is wanted.
+    """
+    input_file, num_reads, seed, cache_dir = args
+    
+    # A cached sample answers without counting the input, which for gzipped
+    # reads would mean decompressing it; entries only exist for partial samples
+    if cache_dir is not None:
+        cache_file = sample_cache_path(cache_dir, input_file, num_reads, seed)
+        if cache_file.exists():
+            return num_reads, cache_file
+    
+    total_reads = read_count(input_file)
+    if num_reads >= total_reads:
+        # The whole file is wanted; let the writer copy it rather than
+        # shipping every byte back through the pool
+        return total_reads, None
+    
+    if cache_dir is None:
+        buffer = io.BytesIO()
+        actual_reads = sample_reads_into(input_file, buffer, num_reads, seed=seed)
+        return actual_reads, buffer.getvalue()
+    
+    # Write the cache entry atomically, so an interrupted run never leaves a partial sample
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, 'wb', buffering=1 << 20) as f:
+            sample_reads_into(input_file, f, num_reads, seed=seed)
+        os.replace(tmp_file, cache_file)
+    except BaseException:
+        # Don't let failed samples pile up in the cache directory
+        tmp_file.unlink(missing_ok=True)
+        raise
+    return num_reads, cache_file
+
+def create_metagenome(euk_files, phage_files, euk_ratio, phage_ratio, output_dir, replicate_num, total_reads=100000,
+                      executor=None, cache_dir=None, compress=False, verbose=False):
     """Create a metagenome with specified ratios"""
     
     # Calculate number of reads for each group
@@ -74,11 +494,14 @@ def create_metagenome(euk_files, phage_files, euk_ratio, phage_ratio, output_dir
     reads_per_euk = euk_reads // len(euk_files) if euk_files else 0
     reads_per_phage = phage_reads // len(phage_files) if phage_files else 0
     
-    print(f"\nCreating metagenome replicate {replicate_num}:")
-    print(f"  Eukaryotes: {euk_reads} reads ({euk_ratio*100:.1f}%)")
-    print(f"  Phages: {phage_reads} reads ({phage_ratio*100:.1f}%)")
-    print(f"  Reads per eukaryote: {reads_per_euk}")
-    print(f"  Reads per phage: {reads_per_phage}")
+    # Collect progress messages so concurrent metagenomes don't interleave
+    log = [
+        f"\nCreating metagenome replicate {replicate_num}:",
+        f"  Eukaryotes: {euk_reads} reads ({euk_ratio*100:.1f}%)",
+        f"  Phages: {phage_reads} reads ({phage_ratio*100:.1f}%)",
+        f"  Reads per eukaryote: {reads_per_euk}",
+        f"  Reads per phage: {reads_per_phage}",
+    ]
     
     # Create output directory
     output_path = Path(output_dir)
@@ -86,40 +509,46 @@ def create_metagenome(euk_files, phage_files, euk_ratio, phage_ratio, output_dir
     
     # Output file
     output_file = output_path / f"metagenome_euk{euk_ratio*100:.0f}_phage{phage_ratio*100:.0f}_rep{replicate_num}.fastq"
+    if compress:
+        output_file = output_file.with_name(output_file.name + '.gz')
+    
+    # Eukaryote reads first, then phage reads
+    jobs = []
+    if reads_per_euk > 0:
+        jobs += [(org_name, read_file, reads_per_euk) for org_name, read_file in euk_files.items()]
+    if reads_per_phage > 0:
+        jobs += [(org_name, read_file, reads_per_phage) for org_name, read_file in phage_files.items()]
+    
+    # Reuse samples from earlier runs where the same request was made
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    
+    # Sample each organism in parallel; results come back in submission order
+    mapper = executor.map if executor is not None else map
+    samples = mapper(_sample_worker, [
+        (read_file, num_reads, organism_seed(org_name, replicate_num, num_reads), cache_dir)
+        for org_name, read_file, num_reads in jobs
+    ])
     
     # Combine reads
-    with open(output_file, 'w') as outfile:
-        # Add eukaryote reads
-        for org_name, read_file in euk_files.items():
-            if reads_per_euk > 0:
-                print(f"  Adding {reads_per_euk} reads from {org_name}")
-                temp_file = output_path / f"temp_{org_name}_rep{replicate_num}.fastq"
-                actual_reads = sample_reads(read_file, temp_file, reads_per_euk, seed=replicate_num)
-                
-                with open(temp_file, 'r') as temp:
-                    outfile.write(temp.read())
-                
-                # Clean up temp file
-                temp_file.unlink()
-                print(f"    Actually added {actual_reads} reads")
-        
-        # Add phage reads
-        for org_name, read_file in phage_files.items():
-            if reads_per_phage > 0:
-                print(f"  Adding {reads_per_phage} reads from {org_name}")
-                temp_file = output_path / f"temp_{org_name}_rep{replicate_num}.fastq"
-                actual_reads = sample_reads(read_file, temp_file, reads_per_phage, seed=replicate_num)
-                
-                with open(temp_file, 'r') as temp:
-                    outfile.write(temp.read())
-                
-                # Clean up temp file
-                temp_file.unlink()
-                print(f"    Actually added {actual_reads} reads")
+    with open(output_file, 'wb', buffering=1 << 20) as raw_outfile, \
+            (BgzfWriter(raw_outfile) if compress else contextlib.nullcontext(raw_outfile)) as outfile:
+        advise_sequential(raw_outfile)
+        for (org_name, read_file, num_reads), (actual_reads, data) in zip(jobs, samples):
+            log.append(f"  Adding {num_reads} reads from {org_name}")
+            if data is None:
+                copy_reads_into(read_file, outfile)
+            elif isinstance(data, bytes):
+                outfile.write(data)
+            else:
+                copy_file_into(data, outfile)
+            log.append(f"    Actually added {actual_reads} reads")
     
     # Count final reads
     final_read_count = count_reads_in_file(output_file)
-    print(f"  Final metagenome: {final_read_count} reads")
+    log.append(f"  Final metagenome: {final_read_count} reads")
+    if verbose:
+        print("\n".join(log))
     
     return output_file, final_read_count
 
@@ -129,6 +558,13 @@ def main():
     parser.add_argument('--output-dir', default='metagenomes', help='Output directory for metagenomes')
     parser.add_argument('--total-reads', type=int, default=100000, help='Total reads per metagenome')
     parser.add_argument('--replicates', type=int, default=3, help='Number of replicates per ratio')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes for sampling')
+    parser.add_argument('--cache', action='store_true',
+                        help=f'Keep sampled reads in <output-dir>/{SAMPLE_CACHE_DIR} and reuse them in later runs '
+                             'with the same inputs and settings; entries are never pruned, so delete the '
+                             'directory to reclaim space')
+    parser.add_argument('--compress', action='store_true', help='Write metagenomes as BGZF-compressed .fastq.gz files')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print per-organism progress while sampling')
     
     args = parser.parse_args()
     
@@ -141,8 +577,8 @@ def main():
     
     # Get read files
     print("Finding read files...")
-    euk_files = get_read_files([base_dir / d for d in euk_dirs])
-    phage_files = get_read_files([base_dir / d for d in phage_dirs])
+    euk_files = get_read_files([base_dir / d for d in euk_dirs], args.verbose)
+    phage_files = get_read_files([base_dir / d for d in phage_dirs], args.verbose)
     
     print(f"\nFound {len(euk_files)} eukaryote files and {len(phage_files)} phage files")
     
@@ -153,14 +589,30 @@ def main():
         (0.3, 0.7),  # 30% eukaryotes, 70% phages
     ]
     
-    # Create metagenomes
-    results = []
-    for euk_ratio, phage_ratio in ratios:
-        for rep in range(1, args.replicates + 1):
-            output_file, read_count = create_metagenome(
-                euk_files, phage_files, euk_ratio, phage_ratio, 
-                output_dir, rep, args.total_reads
-            )
+    # Sampled reads are only cached on disk when asked for; otherwise they
+    # stream from the workers straight into the metagenomes
+    cache_dir = output_dir / SAMPLE_CACHE_DIR if args.cache else None
+    
+    # Create metagenomes; every (ratio, replicate) pair is independent, so one
+    # thread per metagenome feeds its per-organism jobs into a shared process pool
+    grid = [(euk_ratio, phage_ratio, rep) for euk_ratio, phage_ratio in ratios
+            for rep in range(1, args.replicates + 1)]
+    # The pool starts its workers lazily from the writer threads, and forking a
+    # multi-threaded process can deadlock, so prefer a forkserver where available
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    mp_context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp_context) as executor, \
+            ThreadPoolExecutor(max_workers=max(1, len(grid))) as writers:
+        futures = [
+            writers.submit(create_metagenome, euk_files, phage_files, euk_ratio, phage_ratio,
+                           output_dir, rep, args.total_reads, executor, cache_dir, args.compress,
+                           args.verbose)
+            for euk_ratio, phage_ratio, rep in grid
+        ]
+        
+        results = []
+        for (euk_ratio, phage_ratio, rep), future in zip(grid, futures):
+            output_file, read_count = future.result()
             results.append({
                 'file': output_file,
                 'euk_ratio': euk_ratio,
@@ -169,37 +621,46 @@ def main():
                 'reads': read_count
             })
     
-    # Print summary
-    print(f"\n{'='*60}")
-    print("METAGENOME CREATION SUMMARY")
-    print(f"{'='*60}")
-    print(f"Output directory: {output_dir}")
-    print(f"Total metagenomes created: {len(results)}")
-    print(f"\nFiles created:")
-    
+    # Format each metagenome's entry once, for both the console and the summary file
+    entries = []
     for result in results:
-        print(f"  {result['file'].name}")
-        print(f"    Ratio: {result['euk_ratio']*100:.0f}% eukaryotes, {result['phage_ratio']*100:.0f}% phages")
-        print(f"    Replicate: {result['replicate']}")
-        print(f"    Reads: {result['reads']:,}")
-        print()
+        entries.append([
+            f"{result['file'].name}",
+            f"  Ratio: {result['euk_ratio']*100:.0f}% eukaryotes, {result['phage_ratio']*100:.0f}% phages",
+            f"  Replicate: {result['replicate']}",
+            f"  Reads: {result['reads']:,}",
+        ])
+    
+    # Print summary
+    console_lines = [
+        f"\n{'='*60}",
+        "METAGENOME CREATION SUMMARY",
+        f"{'='*60}",
+        f"Output directory: {output_dir}",
+        f"Total metagenomes created: {len(results)}",
+        "\nFiles created:",
+    ]
+    for entry in entries:
+        console_lines.extend(f"  {line}" for line in entry)
+        console_lines.append("")
+    sys.stdout.write("\n".join(console_lines) + "\n")
     
-    # Create a summary file
+    # Create a summary file (the output directory may not exist yet if no metagenomes were made)
+    output_dir.mkdir(parents=True, exist_ok=True)
     summary_file = output_dir / "metagenome_summary.txt"
-    with open(summary_file, 'w') as f:
-        f.write("Metagenome Creation Summary\n")
-        f.write("=" * 40 + "\n\n")
-        f.write(f"Total metagenomes: {len(results)}\n")
-        f.write(f"Total reads per metagenome: {args.total_reads:,}\n")
-        f.write(f"Replicates per ratio: {args.replicates}\n\n")
-        
-        f.write("Files created:\n")
-        f.write("-" * 20 + "\n")
-        for result in results:
-            f.write(f"{result['file'].name}\n")
-            f.write(f"  Ratio: {result['euk_ratio']*100:.0f}% eukaryotes, {result['phage_ratio']*100:.0f}% phages\n")
-            f.write(f"  Replicate: {result['replicate']}\n")
-            f.write(f"  Reads: {result['reads']:,}\n\n")
+    summary_lines = [
+        "Metagenome Creation Summary",
+        "=" * 40 + "\n",
+        f"Total metagenomes: {len(results)}",
+        f"Total reads per metagenome: {args.total_reads:,}",
+        f"Replicates per ratio: {args.replicates}\n",
+        "Files created:",
+        "-" * 20,
+    ]
+    for entry in entries:
+        summary_lines.extend(entry)
+        summary_lines.append("")
+    summary_file.write_text("\n".join(summary_lines) + "\n")
     
     print(f"Summary saved to: {summary_file}")
 
@@ -0,0 +1,102 @@
+"""
+Tests for create_metagenomes.py
+"""
+
+import array
+import gzip
+import io
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import create_metagenomes
+
+
+def make_fastq(num_reads):
+    """Build a small FASTQ file body with num_reads distinct records"""
+    return b''.join(b'@read%d\nACGT\n+\nIIII\n' % i for i in range(num_reads))
+
+
+class SampleReadsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        create_metagenomes.record_offsets.cache_clear()
+        self.addCleanup(create_metagenomes.record_offsets.cache_clear)
+        create_metagenomes.gzip_read_stats.cache_clear()
+        self.addCleanup(create_metagenomes.gzip_read_stats.cache_clear)
+
+    def write_fastq(self, data):
+        path = Path(self.tmp_dir.name) / 'reads.fastq'
+        path.write_bytes(data)
+        return path
+
+    def assert_complete_records(self, data, num_reads):
+        lines = data.split(b'\n')
+        self.assertEqual(lines[-1], b'')
+        self.assertEqual(len(lines) - 1, 4 * num_reads)
+        self.assertTrue(all(name.startswith(b'@read') for name in lines[0:-1:4]))
+
+    def test_trailing_blank_line_is_not_a_read(self):
+        path = self.write_fastq(make_fastq(100) + b'\n')
+        # Dense enough to take the sequential reservoir path; the blank line
+        # only shows up if it wins a reservoir slot, so try several seeds
+        for seed in range(20):
+            out = io.BytesIO()
+            actual_reads = create_metagenomes.sample_reads_into(path, out, 60, seed=seed)
+            self.assertEqual(actual_reads, 60)
+            self.assert_complete_records(out.getvalue(), 60)
+
+    def test_unterminated_last_record_is_dropped(self):
+        path = self.write_fastq(make_fastq(1000)[:-1])
+        self.assertEqual(create_metagenomes.read_count(path), 999)
+        self.assertEqual(create_metagenomes.count_reads_in_file(path), 999)
+        
+        # Sparse samples and whole-file copies must both end on a newline
+        for num_reads in (50, 2000):
+            out = io.BytesIO()
+            actual_reads = create_metagenomes.sample_reads_into(path, out, num_reads, seed=3)
+            self.assert_complete_records(out.getvalue(), actual_reads)
+        self.assertEqual(actual_reads, 999)
+
+    def test_index_scanners_agree(self):
+        if create_metagenomes.np is None:
+            self.skipTest('NumPy is not installed')
+        for data in (make_fastq(3), make_fastq(3)[:-1], make_fastq(3) + b'\n', make_fastq(3)[:-8], b'x'):
+            path = self.write_fastq(data)
+            with_numpy = array.array('Q', [0])
+            create_metagenomes._scan_offsets_numpy(path, len(data), with_numpy)
+            without_numpy = array.array('Q', [0])
+            create_metagenomes._scan_offsets(path, without_numpy)
+            self.assertEqual(with_numpy, without_numpy, data)
+
+    def test_gzip_read_stats_stop_at_last_complete_record(self):
+        path = Path(self.tmp_dir.name) / 'reads.fastq.gz'
+        data = make_fastq(10)
+        path.write_bytes(gzip.compress(data + b'@partial\nAC'))
+        self.assertEqual(create_metagenomes.gzip_read_stats(path), (10, len(data), len(data) + 11))
+        out = io.BytesIO()
+        create_metagenomes.copy_reads_into(path, out)
+        self.assertEqual(out.getvalue(), data)
+
+    def test_gzip_read_stats_reuse_sidecar(self):
+        path = Path(self.tmp_dir.name) / 'reads.fastq.gz'
+        path.write_bytes(gzip.compress(make_fastq(10)))
+        stats = create_metagenomes.gzip_read_stats(path)
+        self.assertTrue(path.with_name(path.name + create_metagenomes.INDEX_SUFFIX).exists())
+        self.assertEqual(create_metagenomes.get_read_files([self.tmp_dir.name]), {self.tmp_dir.name: path})
+
+        # A fresh process would read the counts back instead of decompressing the file again
+        create_metagenomes.gzip_read_stats.cache_clear()
+        with unittest.mock.patch.object(create_metagenomes.gzip, 'open', side_effect=AssertionError):
+            self.assertEqual(create_metagenomes.gzip_read_stats(path), stats)
+
+        # Rewriting the file invalidates the sidecar
+        create_metagenomes.gzip_read_stats.cache_clear()
+        path.write_bytes(gzip.compress(make_fastq(12)))
+        self.assertEqual(create_metagenomes.gzip_read_stats(path)[0], 12)
+
+
+if __name__ == '__main__':
+    unittest.main()